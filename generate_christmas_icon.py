@@ -4,8 +4,56 @@ Generate Christmas version of Spot icon with tonttulakki (Santa hat).
 Creates spot-192-christmas.png and spot-512-christmas.png with hat on top.
 """
 
+import argparse
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import cache, partial
+
 from PIL import Image, ImageDraw
 
+from prepare_christmas_hat import HAT_ROTATED_PATH, HAT_ROTATION_DEGREES
+
+_HAT_CACHE: dict[tuple[int, int], Image.Image] = {}
+
+
+@cache
+def _get_rotated_hat() -> Image.Image:
+    """
+    Load the pre-rotated hat once per process.
+
+    Returns:
+        The tilted hat prepared by prepare_christmas_hat.py as an RGBA image
+    """
+    return Image.open(HAT_ROTATED_PATH).convert("RGBA")
+
+
+def _get_hat(hat_height: int) -> Image.Image:
+    """
+    Return the rotated hat scaled for the given height, memoized by size.
+
+    Args:
+        hat_height: Target hat height in pixels before rotation
+    """
+    hat_rotated = _get_rotated_hat()
+    rotated_width, rotated_height = hat_rotated.size
+
+    # Recover the upright hat height from the expanded rotation bounding box
+    # (w' = w*cos + h*sin, h' = w*sin + h*cos) to keep the original sizing
+    angle = math.radians(HAT_ROTATION_DEGREES)
+    cos_a, sin_a = math.cos(angle), math.sin(angle)
+    upright_height = (cos_a * rotated_height - sin_a * rotated_width) / (
+        cos_a * cos_a - sin_a * sin_a
+    )
+    scale = hat_height / upright_height
+
+    key = (round(rotated_width * scale), round(rotated_height * scale))
+    hat_resized = _HAT_CACHE.get(key)
+    if hat_resized is None:
+        hat_resized = hat_rotated.resize(key, Image.Resampling.LANCZOS)
+        _HAT_CACHE[key] = hat_resized
+    return hat_resized
+
 
 def add_christmas_hat(img, hat_height_ratio=0.2):
     """
@@ -16,48 +64,19 @@ def add_christmas_hat(img, hat_height_ratio=0.2):
         img: PIL Image object
         hat_height_ratio: Ratio of hat height to image height (default 0.2 = 20%, smaller)
     """
-    from PIL import ImageOps
-    
     width, height = img.size
     
     # Try to load the hat template image
     try:
-        hat_template = Image.open("static/santa-hat-template.png")
-        hat_template = hat_template.convert("RGBA")
+        # Calculate hat dimensions for final image - make it smaller
+        hat_rotated = _get_hat(int(height * hat_height_ratio))
     except FileNotFoundError:
-        print("Warning: santa-hat-template.png not found, skipping hat")
+        print(
+            "Warning: santa-hat-rotated.png not found, skipping hat "
+            "(run prepare_christmas_hat.py)"
+        )
         return img
     
-    # Crop to get only the first hat in the upper-left corner
-    # Assuming 6 hats arranged in a grid (2 rows x 3 columns or 3 rows x 2 columns)
-    template_width, template_height = hat_template.size
-    
-    # Try to detect the grid - likely 2x3 or 3x2
-    # For 2x3: each hat is template_width/3 wide, template_height/2 tall
-    # For 3x2: each hat is template_width/2 wide, template_height/3 tall
-    # Let's try 2x3 first (more common for horizontal layouts)
-    hat_crop_width = template_width // 3
-    hat_crop_height = template_height // 2
-    
-    # Crop the upper-left hat
-    hat_cropped = hat_template.crop((0, 0, hat_crop_width, hat_crop_height))
-    
-    # Calculate hat dimensions for final image - make it smaller
-    hat_height = int(height * hat_height_ratio)
-    # Maintain aspect ratio of the cropped hat
-    hat_aspect = hat_crop_width / hat_crop_height
-    hat_width = int(hat_height * hat_aspect)
-    
-    # Resize hat to fit
-    hat_resized = hat_cropped.resize(
-        (hat_width, hat_height),
-        Image.Resampling.LANCZOS
-    )
-    
-    # Rotate clockwise (positive angle = CW)
-    # Rotate by 15 to 25 degrees for a natural tilted look
-    hat_rotated = hat_resized.rotate(20, expand=True, resample=Image.Resampling.BICUBIC)
-    
     # Get the rotated hat dimensions
     rotated_width, rotated_height = hat_rotated.size
     
@@ -81,7 +100,16 @@ def add_christmas_hat(img, hat_height_ratio=0.2):
     return img
 
 
-def create_christmas_icon(original_path, output_path, hat_height_ratio=0.2):
+def png_save_options(*, optimize: bool) -> dict[str, bool | int]:
+    """Fast PNG encoding by default; smallest files when optimizing for release."""
+    if optimize:
+        return {"optimize": True, "compress_level": 9}
+    return {"optimize": False, "compress_level": 1}
+
+
+def create_christmas_icon(
+    original_path, output_path, hat_height_ratio=0.2, *, optimize: bool = False,
+):
     """
     Load original icon, add space at top, and draw Christmas hat.
     
@@ -89,6 +117,7 @@ def create_christmas_icon(original_path, output_path, hat_height_ratio=0.2):
         original_path: Path to original icon file
         output_path: Path to save Christmas version
         hat_height_ratio: Ratio of hat height to original image height
+        optimize: Use maximum PNG compression instead of fast encoding
     """
     # Load original image
     original = Image.open(original_path)
@@ -113,32 +142,44 @@ def create_christmas_icon(original_path, output_path, hat_height_ratio=0.2):
     add_christmas_hat(new_img, hat_height_ratio)
     
     # Save the result
-    new_img.save(output_path, format="PNG", optimize=True)
+    new_img.save(output_path, format="PNG", **png_save_options(optimize=optimize))
     print(f"✓ Created {output_path} ({new_width}x{new_height})")
 
 
-def main():
-    """Generate Christmas versions of both icon sizes."""
+def generate_christmas_icon(size: int, *, optimize: bool = False) -> None:
+    """Generate the Christmas version of one icon size."""
+    original_path = f"static/spot-{size}.png"
+    output_path = f"static/spot-{size}-christmas.png"
+
+    print(f"Generating spot-{size}-christmas.png...")
+    try:
+        create_christmas_icon(original_path, output_path, optimize=optimize)
+    except FileNotFoundError:
+        print(f"✗ Error: {original_path} not found")
+    except Exception as e:
+        print(f"✗ Error creating {output_path}: {e}")
+
+
+def main(*, optimize: bool = False) -> None:
+    """Generate Christmas versions of all icon sizes in parallel."""
     sizes = [192, 512]
-    
-    for size in sizes:
-        original_path = f"static/spot-{size}.png"
-        output_path = f"static/spot-{size}-christmas.png"
-        
-        print(f"Generating spot-{size}-christmas.png...")
-        try:
-            create_christmas_icon(original_path, output_path)
-        except FileNotFoundError:
-            print(f"✗ Error: {original_path} not found")
-        except Exception as e:
-            print(f"✗ Error creating {output_path}: {e}")
-    
+
+    with ProcessPoolExecutor(max_workers=min(len(sizes), os.cpu_count() or 1)) as ex:
+        list(ex.map(partial(generate_christmas_icon, optimize=optimize), sizes))
+
     print("\nChristmas icons generated successfully!")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--optimize",
+        action="store_true",
+        help="use maximum PNG compression (slower, smaller files)",
+    )
+    args = parser.parse_args()
     try:
-        main()
+        main(optimize=args.optimize)
     except ImportError:
         print("Error: Pillow (PIL) is required to generate icons.")
         print("Install it with: uv pip install Pillow")
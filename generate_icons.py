@@ -4,14 +4,18 @@ Generate PWA icon files for Spot is a dog app.
 Creates spot-192.png and spot-512.png with lightning and chart bars design.
 """
 
-from PIL import Image, ImageDraw
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from PIL import Image, ImageColor, ImageDraw, ImageFilter
 
 
 def create_icon(size):
     """Create an icon with lightning bolt and chart bars representing electricity prices."""
     # Create image with black background
     img = Image.new("RGB", (size, size), color="#000000")
-    draw = ImageDraw.Draw(img)
 
     # Center point
     center_x, center_y = size // 2, size // 2
@@ -33,17 +37,24 @@ def create_icon(size):
 
     bar_start_x = center_x - ((num_bars * (bar_width + bar_spacing) - bar_spacing) // 2)
 
-    for i in range(num_bars):
-        x = bar_start_x + i * (bar_width + bar_spacing)
-        bar_height = size * 0.15 * bar_heights[i]
-        y_top = base_y - bar_height
-
-        # Draw bar
-        draw.rectangle(
-            [x, y_top, x + bar_width, base_y],
-            fill=bar_colors[i],
-            outline=bar_colors[i],
+    # Rasterise all bars (inclusive pixel edges, as draw.rectangle would) into
+    # one tile and paste it in a single call
+    bar_tops = [int(base_y - size * 0.15 * h) for h in bar_heights]
+    tile_top = min(bar_tops)
+    tile_bottom = int(base_y) + 1
+    bar_pixels = bar_width + 1
+    gap = b"\x00\x00\x00" * (bar_spacing - 1)
+    filled = [bytes(ImageColor.getrgb(color)) * bar_pixels for color in bar_colors]
+    empty = b"\x00\x00\x00" * bar_pixels
+    rows = [
+        gap.join(
+            filled[i] if y >= bar_tops[i] else empty for i in range(num_bars)
         )
+        for y in range(tile_top, tile_bottom)
+    ]
+    tile_width = num_bars * bar_pixels + (num_bars - 1) * (bar_spacing - 1)
+    bars = Image.frombytes("RGB", (tile_width, len(rows)), b"".join(rows))
+    img.paste(bars, (bar_start_x, tile_top))
 
     # Draw lightning bolt (Z-shaped)
     bolt_color = "#ffcc00"  # Yellow/gold lightning
@@ -63,44 +74,53 @@ def create_icon(size):
         (bolt_x - bolt_size * 0.05, bolt_y + bolt_size * 0.45),
     ]
 
-    # Draw lightning as filled polygon with outline
-    draw.polygon(points, fill=bolt_color, outline=bolt_color)
-
-    # Add glow effect by drawing slightly larger bolt underneath
-    glow_points = [
-        (
-            p[0] + (1 if i % 2 == 0 else -1) * bolt_width * 0.3,
-            p[1] + (1 if i % 2 == 0 else -1) * bolt_width * 0.3,
-        )
-        for i, p in enumerate(points)
-    ]
-    glow_img = img.copy()
-    glow_draw = ImageDraw.Draw(glow_img)
-    glow_draw.polygon(glow_points, fill="#ffaa00", outline="#ffaa00")
-    img = Image.blend(glow_img, img, 0.7)
-    draw = ImageDraw.Draw(img)
-    draw.polygon(points, fill=bolt_color, outline=bolt_color)
+    # Rasterise the bolt once as a mask; its blurred copy is the glow
+    bolt_mask = Image.new("L", (size, size), 0)
+    ImageDraw.Draw(bolt_mask).polygon(points, fill=255, outline=255)
+    glow_radius = max(2, bolt_width // 2)
+    glow_mask = bolt_mask.filter(ImageFilter.GaussianBlur(radius=glow_radius))
+    img.paste("#ffaa00", (0, 0), glow_mask)
+    img.paste(bolt_color, (0, 0), bolt_mask)
 
     return img
 
 
-def main():
-    """Generate both icon sizes."""
+def png_save_options(*, optimize: bool) -> dict[str, bool | int]:
+    """Fast PNG encoding by default; smallest files when optimizing for release."""
+    if optimize:
+        return {"optimize": True, "compress_level": 9}
+    return {"optimize": False, "compress_level": 1}
+
+
+def generate_icon(size: int, *, optimize: bool = False) -> None:
+    """Create and save the icon for one size."""
+    print(f"Generating spot-{size}.png...")
+    icon = create_icon(size)
+    icon_path = f"static/spot-{size}.png"
+    icon.save(icon_path, format="PNG", **png_save_options(optimize=optimize))
+    print(f"✓ Created {icon_path}")
+
+
+def main(*, optimize: bool = False) -> None:
+    """Generate all icon sizes in parallel, one process per size."""
     sizes = [192, 512]
 
-    for size in sizes:
-        print(f"Generating spot-{size}.png...")
-        icon = create_icon(size)
-        icon_path = f"static/spot-{size}.png"
-        icon.save(icon_path, format="PNG", optimize=True)
-        print(f"✓ Created {icon_path}")
+    with ProcessPoolExecutor(max_workers=min(len(sizes), os.cpu_count() or 1)) as ex:
+        list(ex.map(partial(generate_icon, optimize=optimize), sizes))
 
     print("\nIcons generated successfully!")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--optimize",
+        action="store_true",
+        help="use maximum PNG compression (slower, smaller files)",
+    )
+    args = parser.parse_args()
     try:
-        main()
+        main(optimize=args.optimize)
     except ImportError:
         print("Error: Pillow (PIL) is required to generate icons.")
         print("Install it with: uv pip install Pillow")
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Prepare the pre-rotated Santa hat used by generate_christmas_icon.py.
+Crops the upper-left hat from santa-hat-template.png, tilts it and saves
+santa-hat-rotated.png, so icon generation only needs to resize it.
+"""
+
+from PIL import Image
+
+HAT_TEMPLATE_PATH = "static/santa-hat-template.png"
+HAT_ROTATED_PATH = "static/santa-hat-rotated.png"
+
+# Rotate clockwise (positive angle = CW)
+# Rotate by 15 to 25 degrees for a natural tilted look
+HAT_ROTATION_DEGREES = 20
+
+
+def prepare_hat() -> None:
+    """Crop the first hat from the template, rotate it and save it."""
+    hat_template = Image.open(HAT_TEMPLATE_PATH).convert("RGBA")
+
+    # Crop to get only the first hat in the upper-left corner
+    # The template has 6 hats arranged in a grid of 2 rows x 3 columns
+    template_width, template_height = hat_template.size
+    hat_crop_width = template_width // 3
+    hat_crop_height = template_height // 2
+    hat_cropped = hat_template.crop((0, 0, hat_crop_width, hat_crop_height))
+
+    # Rotate at full template resolution; icons only downscale the result
+    hat_rotated = hat_cropped.rotate(
+        HAT_ROTATION_DEGREES, expand=True, resample=Image.Resampling.BICUBIC,
+    )
+    hat_rotated.save(HAT_ROTATED_PATH, format="PNG", optimize=True)
+    print(f"✓ Created {HAT_ROTATED_PATH} {hat_rotated.size}")  # noqa: T201 - CLI output
+
+
+if __name__ == "__main__":
+    prepare_hat()
@@ -3,13 +3,16 @@ from __future__ import annotations
 import asyncio
 import logging
 import os
+import time
 import typing as t
 import xml.etree.ElementTree as ET
 from dataclasses import dataclass
 from datetime import UTC, date, datetime, timedelta
+from io import BytesIO
+from itertools import pairwise
+from zoneinfo import ZoneInfo
 
 import httpx
-from dateutil import tz
 
 if t.TYPE_CHECKING:
     from decimal import Decimal
@@ -18,20 +21,80 @@ FI_EIC = "10YFI-1--------U"
 # Allow overriding via env; default to known working host
 ENTSOE_BASE_URL = os.environ.get("ENTSOE_BASE_URL", "https://web-api.tp.entsoe.eu/api")
 logger = logging.getLogger("spot.entsoe")
+HELSINKI_TZ = ZoneInfo("Europe/Helsinki")
+
+# Current ENTSO-E schema namespaces; other revisions fall back to deriving the
+# namespace from the element tag
+_PUBLICATION_NS = "{urn:iec62325.351:tc57wg16:451-3:publicationdocument:7:3}"
+_ACKNOWLEDGEMENT_NS = "{urn:iec62325.351:tc57wg16:451-1:acknowledgementdocument:7:0}"
+_PUBLICATION_TS_TAG = f"{_PUBLICATION_NS}TimeSeries"
+_ACKNOWLEDGEMENT_TAG = f"{_ACKNOWLEDGEMENT_NS}Acknowledgement_MarketDocument"
+
+# Shared client so sequential fetches reuse pooled TLS connections
+_client: httpx.AsyncClient | None = None
+# A 429 pauses fetches for its Retry-After (monotonic deadline); for the next
+# ten minutes the pollers also space their attempts out further
+RATE_LIMIT_MEMORY_SECONDS = 10 * 60
+_DEFAULT_RETRY_AFTER_SECONDS = 1.0
+_rate_limited_until = 0.0
+_last_rate_limited = float("-inf")
 
 
 class DataNotAvailable(Exception):
     """Raised when ENTSO-E returns no time series for the requested period."""
 
 
-@dataclass(frozen=True)
+class RateLimitError(Exception):
+    """Raised on a 429, and instead of calling ENTSO-E until its Retry-After."""
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client  # noqa: PLW0603 - one pooled client per process, reset on close
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=30,
+            limits=httpx.Limits(max_keepalive_connections=5, max_connections=10),
+        )
+    return _client
+
+
+def rate_limit_backoff() -> float:
+    """Seconds left of the Retry-After pause from the last 429."""
+    return max(0.0, _rate_limited_until - time.monotonic())
+
+
+def rate_limited_recently() -> bool:
+    """Whether ENTSO-E answered 429 within RATE_LIMIT_MEMORY_SECONDS."""
+    return time.monotonic() - _last_rate_limited < RATE_LIMIT_MEMORY_SECONDS
+
+
+def _retry_after_seconds(response: httpx.Response) -> float:
+    # Only the delay-seconds form is honoured; HTTP dates fall back to 1 s
+    try:
+        delay = float(
+            response.headers.get("Retry-After", _DEFAULT_RETRY_AFTER_SECONDS),
+        )
+    except ValueError:
+        return _DEFAULT_RETRY_AFTER_SECONDS
+    return max(delay, 0.0)
+
+
+async def close_client() -> None:
+    """Close the shared HTTP client; call on application shutdown."""
+    global _client  # noqa: PLW0603 - see _get_client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+@dataclass(frozen=True, slots=True)
 class PricePoint:
     start_utc: datetime
     end_utc: datetime
     price_eur_per_mwh: float
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class DaySeries:
     market: str
     granularity: t.Literal["hour", "quarter_hour"]
@@ -39,110 +102,165 @@ class DaySeries:
     published_at_utc: datetime | None
 
 
+_CANONICAL_ISO_LENGTH = len("YYYY-MM-DDTHH:MMZ")
+
+
 def _iso_to_dt(value: str) -> datetime:
+    # Fast path for the canonical ENTSO-E form "YYYY-MM-DDTHH:MMZ"
+    if len(value) == _CANONICAL_ISO_LENGTH and value[-1] == "Z":
+        try:
+            return datetime(
+                int(value[0:4]),
+                int(value[5:7]),
+                int(value[8:10]),
+                int(value[11:13]),
+                int(value[14:16]),
+                tzinfo=UTC,
+            )
+        except ValueError:
+            pass
     return datetime.fromisoformat(value.replace("Z", "+00:00")).astimezone(UTC)
 
 
+_GRANULARITY_BY_DURATION = {"PT60M": "hour", "PT15M": "quarter_hour"}
+
+
 def _duration_to_granularity(duration: str) -> str:
-    if duration == "PT60M":
-        return "hour"
-    if duration == "PT15M":
-        return "quarter_hour"
-    raise ValueError(f"Unsupported resolution: {duration}")
+    try:
+        return _GRANULARITY_BY_DURATION[duration]
+    except KeyError:
+        raise ValueError(f"Unsupported resolution: {duration}") from None
+
+
+def _parse_period(
+    period: ET.Element,
+    q: str,
+) -> tuple[str, list[PricePoint]]:
+    resolution = period.findtext(f"{q}resolution", default="")
+    g = _duration_to_granularity(resolution)
+    points: list[PricePoint] = []
+    start_str = period.findtext(f"{q}timeInterval/{q}start")
+    end_str = period.findtext(f"{q}timeInterval/{q}end")
+    if not start_str or not end_str:
+        return g, points
+    start_dt = _iso_to_dt(start_str)
+    end_dt = _iso_to_dt(end_str)
+    step = timedelta(hours=1) if g == "hour" else timedelta(minutes=15)
+
+    position_tag = f"{q}position"
+    price_tag = f"{q}price.amount"
+    pairs = [
+        (
+            int(p.findtext(position_tag, default="0")),
+            float(p.findtext(price_tag, default="0")),
+        )
+        for p in period.iterfind(f"{q}Point")
+    ]
+    # ENTSO-E emits Points in ascending position order; only sort when a
+    # document breaks that. A repeated position keeps its last price.
+    if any(a >= b for (a, _), (b, _) in pairwise(pairs)):
+        pairs = sorted(dict(pairs).items())
+
+    # Calculate expected number of positions based on period duration
+    period_duration = end_dt - start_dt
+    expected_positions = int(period_duration / step)
+
+    if pairs and pairs[-1][0] < expected_positions:
+        logger.debug(
+            "Gap at end of period: XML has positions 1-%d, expected %d",
+            pairs[-1][0],
+            expected_positions,
+        )
 
+    cur = start_dt
+    for price in _fill_positions(pairs, expected_positions):
+        pt_end = cur + step
+        points.append(PricePoint(cur, pt_end, price))
+        cur = pt_end
+
+    return g, points
+
+
+def _fill_positions(
+    pairs: list[tuple[int, float]],
+    expected_positions: int,
+) -> list[float]:
+    """Prices for positions 1..expected_positions from sorted, unique pairs."""
+    # Fill sequentially; ENTSO-E may skip positions to compress equal values
+    # (including zero or negative prices), so a missing position repeats the
+    # last price within THIS period
+    prices: list[float] = []
+    for pos, price in pairs:
+        if pos <= len(prices):
+            continue
+        gap = min(pos, expected_positions + 1) - 1 - len(prices)
+        if gap:
+            if not prices:
+                # First position(s) missing - use the first available price
+                logger.debug(
+                    "Gap at start: positions 1-%d missing, using next available price %.2f",
+                    gap,
+                    price,
+                )
+            prices.extend([prices[-1] if prices else price] * gap)
+        if pos > expected_positions:
+            break
+        prices.append(price)
+    if len(prices) < expected_positions:
+        prices.extend(
+            [prices[-1] if prices else 0.0] * (expected_positions - len(prices)),
+        )
+    return prices
 
-def parse_publication_xml(xml_bytes: bytes) -> DaySeries:
-    root = ET.fromstring(xml_bytes)
-    ns = {"ns": root.tag.split("}")[0].strip("{")}
-    local_name = root.tag.split("}")[-1]
 
-    if local_name.endswith("Acknowledgement_MarketDocument"):
+def parse_publication_xml(xml_bytes: bytes) -> DaySeries:
+    all_points: list[PricePoint] = []
+    granularity: t.Literal["hour", "quarter_hour"] | None = None
+    published_at: datetime | None = None
+    ts_tag: str | None = None
+    q = ""
+    elem: ET.Element | None = None
+
+    # Stream the document and drop each TimeSeries once consumed, so peak memory
+    # is bounded by a single series instead of the whole DOM
+    for _, elem in ET.iterparse(BytesIO(xml_bytes)):
+        if elem.tag != ts_tag:
+            if ts_tag is not None:
+                continue
+            # Qualified tag names are resolved from the first series; ElementPath
+            # would otherwise re-resolve "ns:" prefixes on every find call
+            if elem.tag == _PUBLICATION_TS_TAG:
+                q = _PUBLICATION_NS
+            elif elem.tag.rpartition("}")[2] == "TimeSeries":
+                q = elem.tag.removesuffix("TimeSeries")
+            else:
+                continue
+            ts_tag = elem.tag
+
+        period = elem.find(f".//{q}Period")
+        if period is not None:
+            g, points = _parse_period(period, q)
+            if granularity is None:
+                granularity = t.cast("t.Literal['hour', 'quarter_hour']", g)
+            all_points.extend(points)
+        elem.clear()
+
+    root = elem
+    if root is not None and root.tag.endswith("Acknowledgement_MarketDocument"):
+        if root.tag == _ACKNOWLEDGEMENT_TAG:
+            q = _ACKNOWLEDGEMENT_NS
+        else:
+            ns_part = root.tag.rpartition("}")[0]
+            q = f"{ns_part}}}" if ns_part else ""
         # Try to extract reason text for diagnostics
-        reasons = [e.text or "" for e in root.findall(".//ns:Reason/ns:text", ns)]
+        reasons = [e.text or "" for e in root.iterfind(f".//{q}Reason/{q}text")]
         msg = "; ".join([r for r in reasons if r]) or "No TimeSeries (acknowledgement)"
         raise DataNotAvailable(msg)
 
-    ts_list = root.findall(".//ns:TimeSeries", ns)
-    if not ts_list:
+    if ts_tag is None:
         # Many cases: No content yet
         raise DataNotAvailable("No TimeSeries in response")
 
-    all_points: list[PricePoint] = []
-    granularity: t.Literal["hour", "quarter_hour"] | None = None
-    published_at: datetime | None = None
-
-    for ts in ts_list:
-        period = ts.find(".//ns:Period", ns)
-        if period is None:
-            continue
-        resolution = period.findtext("ns:resolution", default="", namespaces=ns)
-        g = _duration_to_granularity(resolution)
-        if granularity is None:
-            granularity = t.cast("t.Literal['hour', 'quarter_hour']", g)
-        start_str = period.findtext("ns:timeInterval/ns:start", namespaces=ns)
-        end_str = period.findtext("ns:timeInterval/ns:end", namespaces=ns)
-        if not start_str or not end_str:
-            continue
-        start_dt = _iso_to_dt(start_str)
-        end_dt = _iso_to_dt(end_str)
-        step = timedelta(hours=1) if g == "hour" else timedelta(minutes=15)
-
-        pts = sorted(
-            period.findall("ns:Point", ns),
-            key=lambda e: int(e.findtext("ns:position", default="0", namespaces=ns)),
-        )
-        pos_to_price: dict[int, float] = {}
-        for p in pts:
-            pos = int(p.findtext("ns:position", default="0", namespaces=ns))
-            amount_text = p.findtext("ns:price.amount", default="0", namespaces=ns)
-            price = float(amount_text)
-            pos_to_price[pos] = price
-
-        # Calculate expected number of positions based on period duration
-        period_duration = end_dt - start_dt
-        expected_positions = int(period_duration / step)
-        
-        if pos_to_price:
-            max_position_in_xml = max(pos_to_price.keys())
-            if max_position_in_xml < expected_positions:
-                logger.debug(
-                    "Gap at end of period: XML has positions 1-%d, expected %d",
-                    max_position_in_xml,
-                    expected_positions,
-                )
-
-        # Fill sequentially; ENTSO-E may skip positions to compress equal values
-        # (including zero or negative prices)
-        idx = 1
-        cur = start_dt
-        last_price_in_period: float | None = None  # Track last price within THIS period
-        
-        while idx <= expected_positions:
-            price = pos_to_price.get(idx)
-            if price is None:
-                # Position is missing - ENTSO-E skips positions when price is same as previous
-                if last_price_in_period is not None:
-                    # Use last known price from THIS period
-                    price = last_price_in_period
-                else:
-                    # First position(s) missing - find next available price in this period
-                    price = next(
-                        (v for k, v in sorted(pos_to_price.items()) if k >= idx),
-                        0.0,
-                    )
-                    if price != 0.0:
-                        logger.debug(
-                            "Gap at start: position %d missing, using next available price %.2f",
-                            idx,
-                            price,
-                        )
-            
-            last_price_in_period = price
-            pt_end = cur + step
-            all_points.append(PricePoint(cur, pt_end, price))
-            cur = pt_end
-            idx += 1
-
     if granularity is None:
         raise ValueError("Could not determine granularity")
 
@@ -161,26 +279,24 @@ async def fetch_day_ahead_prices(
 ) -> DaySeries:
     # Create Helsinki timezone start and end times, then convert to UTC
     # ENTSO-E expects local time boundaries for the market data
-    helsinki_tz = tz.gettz("Europe/Helsinki")
-
     period_start_local = datetime(
         target_date.year,
         target_date.month,
         target_date.day,
         0,
         0,
-        tzinfo=helsinki_tz,
+        tzinfo=HELSINKI_TZ,
     )
     period_end_local = period_start_local + timedelta(days=1)
 
     # Convert to UTC for the API request
     period_start = period_start_local.astimezone(UTC)
     period_end = period_end_local.astimezone(UTC)
-    logger.info(f"UTC conversion: {period_start} to {period_end}")
+    logger.info("UTC conversion: %s to %s", period_start, period_end)
 
     # Try 15-minute resolution first if preferred and date is after Oct 1, 2025
     if prefer_15min and target_date >= date(2025, 10, 1):
-        logger.info(f"Attempting to fetch 15-minute resolution for {target_date}")
+        logger.info("Attempting to fetch 15-minute resolution for %s", target_date)
         try:
             result = await _fetch_with_resolution(
                 token,
@@ -190,18 +306,21 @@ async def fetch_day_ahead_prices(
                 prefer_quarter_hour=True,
             )
             if result.granularity == "quarter_hour":
-                logger.info(f"Successfully fetched 15-minute data for {target_date}")
+                logger.info("Successfully fetched 15-minute data for %s", target_date)
                 return result
             logger.info(
-                f"Got hourly data when requesting 15-minute for {target_date}, falling back",
+                "Got hourly data when requesting 15-minute for %s, falling back",
+                target_date,
             )
         except DataNotAvailable as e:
             logger.info(
-                f"15-minute data not available for {target_date}: {e}, trying hourly",
+                "15-minute data not available for %s: %s, trying hourly",
+                target_date,
+                e,
             )
 
     # Fall back to hourly resolution or use it as default
-    logger.info(f"Fetching hourly resolution for {target_date}")
+    logger.info("Fetching hourly resolution for %s", target_date)
     result = await _fetch_with_resolution(
         token,
         period_start,
@@ -212,26 +331,31 @@ async def fetch_day_ahead_prices(
 
     # For testing: simulate 15-minute data by expanding hourly data
     if prefer_15min and result.granularity == "hour":
-        logger.info(f"Simulating 15-minute data from hourly data for {target_date}")
+        logger.info("Simulating 15-minute data from hourly data for %s", target_date)
         result = _simulate_15min_from_hourly(result)
 
     return result
 
 
+_QUARTER_HOUR = timedelta(minutes=15)
+_QUARTER_OFFSETS = tuple(_QUARTER_HOUR * quarter for quarter in range(4))
+
+
 def _simulate_15min_from_hourly(hourly_data: DaySeries) -> DaySeries:
     """Convert hourly data to simulated 15-minute data for testing purposes."""
     if hourly_data.granularity != "hour":
         return hourly_data
 
-    simulated_points = []
-    for point in hourly_data.points:
-        # Create 4 identical 15-minute intervals for each hour
-        for quarter in range(4):
-            start_time = point.start_utc + timedelta(minutes=quarter * 15)
-            end_time = start_time + timedelta(minutes=15)
-            simulated_points.append(
-                PricePoint(start_time, end_time, point.price_eur_per_mwh),
-            )
+    # Create 4 identical 15-minute intervals for each hour
+    simulated_points = [
+        PricePoint(
+            point.start_utc + offset,
+            point.start_utc + offset + _QUARTER_HOUR,
+            point.price_eur_per_mwh,
+        )
+        for point in hourly_data.points
+        for offset in _QUARTER_OFFSETS
+    ]
 
     return DaySeries(
         market=hourly_data.market,
@@ -249,6 +373,12 @@ async def _fetch_with_resolution(
     prefer_quarter_hour: bool = False,
 ) -> DaySeries:
     """Internal helper to fetch data with specific resolution preference."""
+    # Process-wide rate-limit state, shared by every caller of the client
+    global _rate_limited_until, _last_rate_limited  # noqa: PLW0603
+    if time.monotonic() < _rate_limited_until:
+        msg = f"ENTSO-E rate limited; retry in {rate_limit_backoff():.1f} s"
+        raise RateLimitError(msg)
+
     params = {
         "securityToken": token,
         "documentType": "A44",
@@ -267,21 +397,28 @@ async def _fetch_with_resolution(
         logger.debug("Requesting finest available resolution (hoping for 15-minute)")
 
     safe_params = {k: v for k, v in params.items() if k != "securityToken"}
-    logger.info(f"ENTSO-E GET {ENTSOE_BASE_URL} params={safe_params}")
-
-    async with httpx.AsyncClient(timeout=30) as client:
-        r = await client.get(ENTSOE_BASE_URL, params=params)
-        if r.status_code == 429:
-            await asyncio.sleep(1)
-            r = await client.get(ENTSOE_BASE_URL, params=params)
-        r.raise_for_status()
-        try:
-            return parse_publication_xml(r.content)
-        except DataNotAvailable as e:
-            # Log a short snippet for diagnostics
-            snippet = r.content[:200].decode(errors="ignore")
-            logger.info("ENTSO-E data not available: %s | body: %s", e, snippet)
-            raise
+    logger.info("ENTSO-E GET %s params=%s", ENTSOE_BASE_URL, safe_params)
+
+    client = _get_client()
+    r = await client.get(ENTSOE_BASE_URL, params=params)
+    if r.status_code == 429:
+        # No sleep on the request path: fail fast until Retry-After has passed,
+        # and let the pollers widen their intervals for a while
+        pause = _retry_after_seconds(r)
+        _last_rate_limited = time.monotonic()
+        _rate_limited_until = _last_rate_limited + pause
+        logger.warning("ENTSO-E rate limiting; retrying after %.1f s", pause)
+        msg = f"ENTSO-E answered 429; retry in {pause:.1f} s"
+        raise RateLimitError(msg)
+    r.raise_for_status()
+    try:
+        # Parse in a worker thread so the event loop keeps serving requests
+        return await asyncio.to_thread(parse_publication_xml, r.content)
+    except DataNotAvailable as e:
+        # Log a short snippet for diagnostics
+        snippet = r.content[:200].decode(errors="ignore")
+        logger.info("ENTSO-E data not available: %s | body: %s", e, snippet)
+        raise
 
 
 def get_prices(
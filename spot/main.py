@@ -1,22 +1,34 @@
 from __future__ import annotations
 
 import asyncio
+import hashlib
+import heapq
 import json
 import logging
 import os
+import random
+import re
+import time
 import typing as t
+from bisect import bisect_right
+from contextlib import asynccontextmanager
 from dataclasses import dataclass, field
 from datetime import UTC, date, datetime, timedelta
+from datetime import time as dt_time
+from functools import lru_cache
+from itertools import chain, count
+from operator import attrgetter
 from pathlib import Path
+from zoneinfo import ZoneInfo
 
-from dateutil import tz
+import orjson
 from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.responses import (
     FileResponse,
     HTMLResponse,
-    JSONResponse,
+    ORJSONResponse,
     Response,
     StreamingResponse,
 )
@@ -33,13 +45,34 @@ logging.basicConfig(
 logger = logging.getLogger("spot")
 
 ENTSOE_API_TOKEN = os.environ.get("ENTSOE_API_TOKEN")
+# Optional snapshot file so restarts can skip the startup fetch
+SPOT_CACHE_PATH = os.environ.get("SPOT_CACHE_PATH")
 DEFAULT_MARGIN_CENTS_PER_KWH = float(
     os.environ.get("DEFAULT_MARGIN_CENTS_PER_KWH", "0.60"),
 )
 VAT_RATE = 0.255
-HELSINKI_TZ = tz.gettz("Europe/Helsinki")
+# 1 MWh = 1000 kWh; EUR/MWh to EUR/kWh then to cents; include VAT
+CENTS_PER_KWH_PER_EUR_MWH = 100.0 / 1000.0 * (1.0 + VAT_RATE)
+HELSINKI_TZ = ZoneInfo("Europe/Helsinki")
 QUARTER_DAY_INTERVALS = 96
+MARKET = "FI"
 DEFAULT_GRANULARITY: t.Literal["quarter_hour"] = "quarter_hour"
+# Spot price bands in c/kWh: green < 5, yellow 5-15, red >= 15
+SPOT_COLOR_THRESHOLDS = (5.0, 15.0)
+SPOT_COLORS = ("green", "yellow", "red")
+RENDERED_PARTIALS_MAX = 256
+FAVICON_PATH = Path(__file__).resolve().parent.parent / "static" / "spot-192.png"
+FAVICON_HEADERS = {"Cache-Control": "public, max-age=31536000"}
+HEALTH_CHECK_SECONDS = 15 * 60
+# How long a "not published yet" answer is trusted by on-demand page fetches
+UNAVAILABLE_RETRY_SECONDS = 5 * 60
+UNAVAILABLE_DATES_MAX = 64
+POLL_WINDOW_START = dt_time(14, 0)
+# Cheap shape check so malformed dates are rejected before parsing
+ISO_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+SSE_KEEPALIVE_FRAME = b": ping\n\n"
+# Cached-day responses may be stored but must be revalidated via their ETag
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
 
 
 @dataclass(frozen=True)
@@ -47,6 +80,14 @@ class PriceInterval:
     start_utc: datetime
     end_utc: datetime
     price_eur_per_mwh: float
+    # Helsinki-local start, converted once instead of at every lookup
+    start_local: datetime = field(init=False, repr=False, compare=False)
+    start_local_date: date = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        start_local = self.start_utc.astimezone(HELSINKI_TZ)
+        object.__setattr__(self, "start_local", start_local)
+        object.__setattr__(self, "start_local_date", start_local.date())
 
 
 @dataclass(frozen=True)
@@ -67,9 +108,18 @@ class DayMetadata:
 
 @dataclass
 class Cache:
-    intervals: list[PriceInterval] = field(default_factory=list)
+    by_day: dict[date, list[PriceInterval]] = field(default_factory=dict)
     day_metadata: dict[date, DayMetadata] = field(default_factory=dict)
     last_refresh_utc: datetime | None = None
+    # Bumped whenever cached intervals change; keys derived results and ETags.
+    # Seeded from the clock so a restarted process never reuses a version.
+    version: int = field(default_factory=time.time_ns)
+
+    @property
+    def intervals(self) -> list[PriceInterval]:
+        return list(
+            chain.from_iterable(self.by_day[day] for day in sorted(self.by_day)),
+        )
 
     def prune(self, now_utc: datetime | None = None) -> None:
         reference_local = (
@@ -77,30 +127,46 @@ class Cache:
         )
         current_local_date = reference_local.date()
         keep_from = current_local_date
-        self.intervals = [
-            it for it in self.intervals if _local_date(it.start_utc) >= keep_from
-        ]
-        valid_dates = {_local_date(it.start_utc) for it in self.intervals}
-        for day_key in list(self.day_metadata.keys()):
-            if day_key not in valid_dates:
-                self.day_metadata.pop(day_key, None)
+        if any(day < keep_from for day in self.by_day):
+            self.by_day = {
+                day: intervals
+                for day, intervals in self.by_day.items()
+                if day >= keep_from
+            }
+            self.version += 1
+        self.day_metadata = {
+            day: meta for day, meta in self.day_metadata.items() if day in self.by_day
+        }
 
-    def upsert_day(self, target_date: date, day_prices: DayPrices) -> None:
-        now_utc = datetime.now(UTC)
-        self.intervals = [
-            it for it in self.intervals if _local_date(it.start_utc) != target_date
-        ]
-        self.intervals.extend(day_prices.intervals)
-        self.intervals.sort(key=lambda it: it.start_utc)
+    def upsert_day(
+        self,
+        target_date: date,
+        day_prices: DayPrices,
+        now_utc: datetime | None = None,
+    ) -> None:
+        now_utc = now_utc or datetime.now(UTC)
+        intervals = sorted(
+            (
+                it
+                for it in day_prices.intervals
+                if it.start_local_date == target_date
+            ),
+            key=attrgetter("start_utc"),
+        )
+        if intervals:
+            self.by_day[target_date] = intervals
+        else:
+            self.by_day.pop(target_date, None)
         self.day_metadata[target_date] = _metadata_from_day_prices(
             day_prices,
             fetched_at=now_utc,
         )
         self.last_refresh_utc = now_utc
+        self.version += 1
         self.prune(now_utc)
 
     def intervals_for_date(self, target_date: date) -> list[PriceInterval]:
-        return [it for it in self.intervals if _local_date(it.start_utc) == target_date]
+        return self.by_day.get(target_date, [])
 
     def has_complete_day(self, target_date: date) -> bool:
         meta = self.day_metadata.get(target_date)
@@ -109,9 +175,67 @@ class Cache:
         intervals = self.intervals_for_date(target_date)
         return len(intervals) >= meta.expected_intervals
 
+    def dump(self, path: Path) -> None:
+        snapshot = {
+            day.isoformat(): {
+                "granularity": meta.granularity,
+                "expected_intervals": meta.expected_intervals,
+                "published_at_utc": (
+                    meta.published_at_utc.isoformat()
+                    if meta.published_at_utc
+                    else None
+                ),
+                "last_fetched_utc": meta.last_fetched_utc.isoformat(),
+                "intervals": [
+                    [
+                        it.start_utc.isoformat(),
+                        it.end_utc.isoformat(),
+                        it.price_eur_per_mwh,
+                    ]
+                    for it in self.by_day.get(day, [])
+                ],
+            }
+            for day, meta in self.day_metadata.items()
+        }
+        # Write beside the target and rename so a crash never leaves half a file
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_text(json.dumps(snapshot))
+        tmp_path.replace(path)
+
+    def load(self, path: Path, now_utc: datetime | None = None) -> None:
+        by_day: dict[date, list[PriceInterval]] = {}
+        day_metadata: dict[date, DayMetadata] = {}
+        for day_iso, entry in json.loads(path.read_text()).items():
+            day = date.fromisoformat(day_iso)
+            intervals = [
+                PriceInterval(
+                    start_utc=datetime.fromisoformat(start),
+                    end_utc=datetime.fromisoformat(end),
+                    price_eur_per_mwh=float(price),
+                )
+                for start, end, price in entry["intervals"]
+            ]
+            if intervals:
+                by_day[day] = intervals
+            published = entry["published_at_utc"]
+            day_metadata[day] = DayMetadata(
+                granularity=entry["granularity"],
+                expected_intervals=entry["expected_intervals"],
+                published_at_utc=(
+                    datetime.fromisoformat(published) if published else None
+                ),
+                last_fetched_utc=datetime.fromisoformat(entry["last_fetched_utc"]),
+            )
+        self.by_day.update(by_day)
+        self.day_metadata.update(day_metadata)
+        # Bump from this process's clock-seeded version, never from one saved
+        # by the previous process, so restored days get fresh ETags
+        self.version += 1
+        self.prune(now_utc)
+
 
 cache = Cache()
-background_tasks: list[asyncio.Task] = []
+background_tasks: set[asyncio.Task] = set()
 
 
 def _track_background_task(
@@ -120,21 +244,12 @@ def _track_background_task(
 ) -> asyncio.Task:
     task = asyncio.create_task(coro)
     task.set_name(name)
-    background_tasks.append(task)
-
-    def _cleanup(fut: asyncio.Task) -> None:
-        if fut in background_tasks:
-            background_tasks.remove(fut)
-
-    task.add_done_callback(_cleanup)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
     logger.debug("Scheduled background task %s", name)
     return task
 
 
-def _local_date(dt: datetime) -> date:
-    return dt.astimezone(HELSINKI_TZ).date()
-
-
 def _metadata_from_day_prices(
     day_prices: DayPrices,
     *,
@@ -160,8 +275,10 @@ def resolve_target_date(
     if date_str == "tomorrow":
         return tomorrow, True
 
+    if not ISO_DATE_RE.fullmatch(date_str):
+        raise HTTPException(status_code=400, detail="Invalid date")
     try:
-        target = datetime.fromisoformat(date_str).date()
+        target = date.fromisoformat(date_str)
     except ValueError as exc:
         raise HTTPException(status_code=400, detail="Invalid date") from exc
 
@@ -169,29 +286,69 @@ def resolve_target_date(
     return target, persist
 
 
+@lru_cache(maxsize=8)
 def create_placeholder_intervals(
     target_date: date,
-) -> list[PriceInterval]:
+) -> tuple[PriceInterval, ...]:
     step = timedelta(minutes=15)
-    count = QUARTER_DAY_INTERVALS
 
     start_local = datetime.combine(
         target_date,
         datetime.min.time(),
         tzinfo=HELSINKI_TZ,
     )
+    end_local = datetime.combine(
+        target_date + timedelta(days=1),
+        datetime.min.time(),
+        tzinfo=HELSINKI_TZ,
+    )
+    # Step in UTC between local midnights (92/100 quarters on DST days);
+    # intervals are frozen, so the memoized tuple is safe to share
+    start_utc = start_local.astimezone(UTC)
+    count = (end_local.astimezone(UTC) - start_utc) // step
+
+    return tuple(
+        PriceInterval(
+            start_utc=start_utc + i * step,
+            end_utc=start_utc + (i + 1) * step,
+            price_eur_per_mwh=0.0,
+        )
+        for i in range(count)
+    )
 
-    intervals: list[PriceInterval] = []
-    for i in range(count):
-        start_ts = (start_local + i * step).astimezone(UTC)
-        intervals.append(
-            PriceInterval(
-                start_utc=start_ts,
-                end_utc=start_ts + step,
-                price_eur_per_mwh=0.0,
-            ),
+
+def next_polling_window(now_hel: datetime) -> datetime:
+    """Start of the next daily 14:00 Helsinki polling window after now_hel."""
+    start = datetime.combine(now_hel.date(), POLL_WINDOW_START, tzinfo=HELSINKI_TZ)
+    if now_hel >= start:
+        start = datetime.combine(
+            now_hel.date() + timedelta(days=1),
+            POLL_WINDOW_START,
+            tzinfo=HELSINKI_TZ,
         )
-    return intervals
+    return start
+
+
+def seconds_until(moment: datetime) -> float:
+    # Subtract against UTC: aware datetimes sharing a tzinfo ignore DST offsets
+    return max(0.0, (moment - datetime.now(UTC)).total_seconds())
+
+
+def make_etag(*parts: object) -> str:
+    digest = hashlib.blake2b(
+        ":".join(map(str, parts)).encode(),
+        digest_size=8,
+    ).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return any(
+        tag.strip().removeprefix("W/") in (etag, "*") for tag in header.split(",")
+    )
 
 
 class ProxyHeadersMiddleware(BaseHTTPMiddleware):
@@ -212,11 +369,30 @@ def create_app() -> FastAPI:
     if not ENTSOE_API_TOKEN:
         raise RuntimeError("ENTSOE_API_TOKEN is required")
 
-    app = FastAPI(title="Spot is a dog")
+    @asynccontextmanager
+    async def lifespan(_app: FastAPI) -> t.AsyncIterator[None]:
+        # The startup and shutdown helpers close over state defined below
+        await startup_tasks()
+        try:
+            yield
+        finally:
+            await shutdown_tasks()
+
+    app = FastAPI(title="Spot is a dog", lifespan=lifespan)
     logger.info("Starting app: Spot is a dog")
     logger.info("Log level: %s", LOG_LEVEL)
     logger.info("Default margin (c/kWh): %s", DEFAULT_MARGIN_CENTS_PER_KWH)
 
+    cache_path = Path(SPOT_CACHE_PATH) if SPOT_CACHE_PATH else None
+
+    # The version is fixed at build time; resolve it, its body and SSE event once
+    app_version = os.environ.get("SPOT_VERSION", "dev")
+    version_body = orjson.dumps({"version": app_version})
+    version_event = (
+        "event: version_update\n"
+        f'data: {{"type": "version", "version": "{app_version}"}}\n\n'
+    ).encode()
+
     # Add cache-control middleware for proper browser caching
     @app.middleware("http")
     async def add_cache_control_headers(request, call_next):
@@ -230,6 +406,9 @@ def create_app() -> FastAPI:
         # Non-versioned static files should be cached but revalidated
         elif path.startswith("/static/"):
             response.headers["Cache-Control"] = "public, max-age=3600, must-revalidate"
+        # Responses with an ETag carry their own revalidation headers
+        elif "etag" in response.headers:
+            pass
         # HTML pages and dynamic content should not be cached
         elif path in ["/", "/index"] or not path.startswith("/api"):
             response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
@@ -238,11 +417,17 @@ def create_app() -> FastAPI:
         
         return response
 
-    app.add_middleware(GZipMiddleware, minimum_size=1024)
+    # Level 6 is about 4x faster than the default 9 on the prices partial for
+    # under 2% more bytes; SSE streams are excluded by the middleware itself
+    app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=6)
     app.add_middleware(ProxyHeadersMiddleware)
     app.add_middleware(TrustedHostMiddleware, allowed_hosts=["*"])
 
     templates = Jinja2Templates(directory="templates")
+    # Resolved once; pages render straight to HTML without TemplateResponse
+    index_template = templates.get_template("index.html")
+    prices_template = templates.get_template("partials/prices.html")
+    default_margin_url = f"/?margin={DEFAULT_MARGIN_CENTS_PER_KWH:.2f}"
     app.mount("/static", StaticFiles(directory="static"), name="static")
 
     @app.get("/healthz")
@@ -251,65 +436,47 @@ def create_app() -> FastAPI:
 
     @app.get("/favicon.ico")
     async def favicon() -> FileResponse:
-        icon_path = Path(__file__).parent.parent.joinpath("static/spot-192.png")
         return FileResponse(
-            icon_path,
+            FAVICON_PATH,
             media_type="image/png",
-            headers={"Cache-Control": "public, max-age=31536000"},
+            headers=FAVICON_HEADERS,
         )
 
     @app.get("/version")
-    async def version() -> dict[str, str]:
-        return {"version": os.environ.get("SPOT_VERSION", "dev")}
+    async def version() -> Response:
+        return Response(content=version_body, media_type="application/json")
 
     @app.get("/events/version")
     async def version_events() -> StreamingResponse:
         async def eventgen():
-            # Create a queue for this connection
-            event_queue = asyncio.Queue()
-
-            # Register callback to receive cache events
-            async def on_cache_event(event_data):
-                await event_queue.put(event_data)
-
-            cache_event_callbacks.append(on_cache_event)
+            # Create a bounded queue for this connection and register it
+            event_queue: asyncio.Queue[bytes] = asyncio.Queue(maxsize=32)
+            cache_event_queues.add(event_queue)
             logger.info(
                 "New SSE connection established, total clients: %d",
-                len(cache_event_callbacks),
+                len(cache_event_queues),
             )
 
             try:
                 # Send initial version
-                ver = os.environ.get("SPOT_VERSION", "dev")
-                logger.info("Sending initial version to client: %s", ver)
-                yield f'event: version_update\ndata: {{"type": "version", "version": "{ver}"}}\n\n'
+                logger.info("Sending initial version to client: %s", app_version)
+                yield version_event
 
                 while True:
                     try:
                         # Wait for cache events or timeout after 30 seconds
-                        event_data = await asyncio.wait_for(
-                            event_queue.get(),
-                            timeout=30.0,
-                        )
-                        # Extract event type from event_data
-                        event_type = event_data.get("type", "message")
-                        # Send with proper SSE event name
-                        yield f"event: {event_type}\ndata: {json.dumps(event_data)}\n\n"
+                        # Frames arrive already encoded by notify_cache_event
+                        yield await asyncio.wait_for(event_queue.get(), timeout=30.0)
                     except TimeoutError:
-                        # Send periodic version updates
-                        ver = os.environ.get("SPOT_VERSION", "dev")
-                        logger.debug(
-                            "Sending periodic version update to client: %s",
-                            ver,
-                        )
-                        yield f'event: version_update\ndata: {{"type": "version", "version": "{ver}"}}\n\n'
+                        # Idle: a comment frame keeps proxies from closing the
+                        # stream; reconnects already resend the version
+                        yield SSE_KEEPALIVE_FRAME
             finally:
-                # Clean up callback when connection closes
-                if on_cache_event in cache_event_callbacks:
-                    cache_event_callbacks.remove(on_cache_event)
+                # Clean up queue when connection closes
+                cache_event_queues.discard(event_queue)
                 logger.info(
                     "SSE connection closed, remaining clients: %d",
-                    len(cache_event_callbacks),
+                    len(cache_event_queues),
                 )
 
         return StreamingResponse(
@@ -322,11 +489,20 @@ def create_app() -> FastAPI:
             },
         )
 
-    from .entsoe import DataNotAvailable, fetch_day_ahead_prices
+    from .entsoe import (
+        DataNotAvailable,
+        RateLimitError,
+        close_client,
+        fetch_day_ahead_prices,
+        rate_limit_backoff,
+        rate_limited_recently,
+    )
 
-    async def fetch_prices_for_day(target_date: date) -> DayPrices:
+    async def fetch_prices_from_entsoe(target_date: date) -> DayPrices:
         logger.info(
-            f"Fetching prices for date: {target_date} (Helsinki time: {datetime.now(tz=HELSINKI_TZ)})",
+            "Fetching prices for date: %s (Helsinki time: %s)",
+            target_date,
+            datetime.now(tz=HELSINKI_TZ),
         )
         prefer_15min = True
         if not ENTSOE_API_TOKEN:
@@ -341,7 +517,11 @@ def create_app() -> FastAPI:
             for p in ds.points
         ]
         logger.info(
-            f"Fetched {len(intervals)} intervals ({ds.granularity}) for {target_date}, first interval: {intervals[0].start_utc.astimezone(HELSINKI_TZ) if intervals else 'None'}",
+            "Fetched %d intervals (%s) for %s, first interval: %s",
+            len(intervals),
+            ds.granularity,
+            target_date,
+            intervals[0].start_local if intervals else None,
         )
         return DayPrices(
             market=ds.market,
@@ -350,8 +530,26 @@ def create_app() -> FastAPI:
             published_at_utc=ds.published_at_utc,
         )
 
-    # Cache event callbacks for notifying browsers
-    cache_event_callbacks = []
+    # Concurrent requests for the same date share one upstream fetch
+    inflight_fetches: dict[date, asyncio.Task[DayPrices]] = {}
+
+    async def fetch_prices_for_day(target_date: date) -> DayPrices:
+        task = inflight_fetches.get(target_date)
+        if task is None:
+            task = asyncio.create_task(fetch_prices_from_entsoe(target_date))
+            inflight_fetches[target_date] = task
+
+            def _forget(done: asyncio.Task[DayPrices]) -> None:
+                inflight_fetches.pop(target_date, None)
+                if not done.cancelled():
+                    done.exception()  # Mark retrieved if every caller went away
+
+            task.add_done_callback(_forget)
+        # Shield so one cancelled caller does not cancel the fetch for the others
+        return await asyncio.shield(task)
+
+    # One event queue per connected browser (SSE connection)
+    cache_event_queues: set[asyncio.Queue[bytes]] = set()
 
     async def notify_cache_event(event_type: str, data: dict | None = None):
         """Notify all connected browsers about cache events"""
@@ -360,24 +558,42 @@ def create_app() -> FastAPI:
             event_data.update(data)
 
         logger.info(
-            f"Sending cache event to {len(cache_event_callbacks)} clients: {event_type}",
+            "Sending cache event to %d clients: %s",
+            len(cache_event_queues),
+            event_type,
         )
 
-        # Call all registered callbacks (WebSocket/SSE connections)
-        for callback in cache_event_callbacks[
-            :
-        ]:  # Copy list to avoid modification during iteration
+        # Encode the SSE frame once and share it across all clients
+        frame = b"event: %s\ndata: %s\n\n" % (
+            event_data["type"].encode(),
+            orjson.dumps(event_data),
+        )
+        # Enqueue without waiting so a slow client cannot delay the others
+        for event_queue in cache_event_queues:
             try:
-                await callback(event_data)
-            except Exception as e:
-                logger.warning(f"Failed to notify cache event callback: {e}")
-                # Remove failed callbacks
-                cache_event_callbacks.remove(callback)
+                event_queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                logger.warning("SSE client queue full, dropping %s event", event_type)
+
+    # Fetch-and-store runs that must finish even if their caller is cancelled
+    store_tasks: set[asyncio.Task[bool]] = set()
 
     async def fetch_and_store_day(
         target_date: date,
         *,
         label: str,
+    ) -> bool:
+        # Shielded so a cancelled caller (e.g. at shutdown) cannot drop a
+        # fetch that is already under way before it reaches the cache
+        task = asyncio.create_task(store_fetched_day(target_date, label=label))
+        store_tasks.add(task)
+        task.add_done_callback(store_tasks.discard)
+        return await asyncio.shield(task)
+
+    async def store_fetched_day(
+        target_date: date,
+        *,
+        label: str,
     ) -> bool:
         logger.info("Fetching %s prices for %s", label, target_date)
         try:
@@ -390,6 +606,9 @@ def create_app() -> FastAPI:
                 exc,
             )
             return False
+        except RateLimitError as exc:
+            logger.info("Skipping %s prices for %s: %s", label, target_date, exc)
+            return False
         except asyncio.CancelledError:
             raise
         except Exception:
@@ -419,10 +638,26 @@ def create_app() -> FastAPI:
             return
 
         cache.prune(datetime.now(UTC))
-        for target_date in target_dates:
-            if cache.has_complete_day(target_date):
-                continue
-            await fetch_and_store_day(target_date, label=target_date.isoformat())
+        # fetch_and_store_day handles its own errors, so one failing day
+        # cannot abort the others
+        await asyncio.gather(
+            *(
+                fetch_and_store_day(target_date, label=target_date.isoformat())
+                for target_date in target_dates
+                if not cache.has_complete_day(target_date)
+            ),
+        )
+
+    # Monotonic time before which a date ENTSO-E had no data for is not re-asked
+    unavailable_until: dict[date, float] = {}
+
+    def rate_limited_error(exc: RateLimitError) -> HTTPException:
+        # Not a placeholder: that would be memoized and tagged as a real day
+        return HTTPException(
+            status_code=503,
+            detail=str(exc),
+            headers={"Retry-After": str(int(rate_limit_backoff()) + 1)},
+        )
 
     async def ensure_day_available(
         target_date: date,
@@ -436,23 +671,37 @@ def create_app() -> FastAPI:
         if intervals:
             return intervals, metadata
 
+        if time.monotonic() < unavailable_until.get(target_date, 0.0):
+            logger.debug("Data for %s recently unavailable, skipping", target_date)
+            return [], None
+
         logger.info("Cache miss for %s, fetching directly", target_date)
         try:
             dp = await fetch_prices_for_day(target_date)
         except DataNotAvailable as exc:
             logger.warning("Data not available for %s: %s", target_date, exc)
+            if len(unavailable_until) >= UNAVAILABLE_DATES_MAX:
+                unavailable_until.clear()
+            unavailable_until[target_date] = (
+                time.monotonic() + UNAVAILABLE_RETRY_SECONDS
+            )
             return [], None
+        except RateLimitError as exc:
+            logger.warning("Not fetching %s: %s", target_date, exc)
+            raise rate_limited_error(exc) from exc
         except asyncio.CancelledError:
             raise
         except Exception:
             logger.exception("Failed to fetch data for %s", target_date)
             raise
 
+        unavailable_until.pop(target_date, None)
+        fetched_at = datetime.now(UTC)
         if persist:
-            cache.upsert_day(target_date, dp)
+            cache.upsert_day(target_date, dp, fetched_at)
             metadata = cache.day_metadata.get(target_date)
         else:
-            metadata = _metadata_from_day_prices(dp)
+            metadata = _metadata_from_day_prices(dp, fetched_at=fetched_at)
 
         return dp.intervals, metadata
 
@@ -465,83 +714,79 @@ def create_app() -> FastAPI:
         if margin is None:
             from fastapi.responses import RedirectResponse
 
-            redirect_url = f"/?margin={DEFAULT_MARGIN_CENTS_PER_KWH:.2f}"
-            return RedirectResponse(url=redirect_url, status_code=302)
+            return RedirectResponse(url=default_margin_url, status_code=302)
 
         # Validate margin parameter
         margin = validate_margin(margin)
 
         # Only ensure cache if it's not already populated (avoid delays on first page load)
-        if not cache.intervals:
+        if not cache.by_day:
             logger.info("Cache not warmed up yet, ensuring cache for first page load")
             today = datetime.now(tz=HELSINKI_TZ).date()
             await ensure_days_available([today, today + timedelta(days=1)])
         else:
             logger.debug("Cache already warm, serving page immediately")
 
-        return templates.TemplateResponse(
-            "index.html",
-            {
-                "request": request,
-                "app_name": "Spot is a dog",
-                "margin_cents": margin,
-                "app_version": os.environ.get("SPOT_VERSION", "dev"),
-            },
+        return HTMLResponse(
+            index_template.render(
+                {
+                    "request": request,
+                    "app_name": "Spot is a dog",
+                    "margin_cents": margin,
+                    "app_version": app_version,
+                },
+            ),
         )
 
-    @app.get("/api/prices", response_class=JSONResponse)
-    async def api_prices(date_str: str) -> JSONResponse:
+    @app.get("/api/prices", response_class=ORJSONResponse)
+    async def api_prices(date_str: str) -> ORJSONResponse:
         target = datetime.fromisoformat(date_str).date()
         logger.debug("/api/prices date=%s", target)
-        dp = await fetch_prices_for_day(target)
-        return JSONResponse(
+        if cache.has_complete_day(target):
+            market = MARKET
+            granularity = cache.day_metadata[target].granularity
+            intervals = cache.intervals_for_date(target)
+        else:
+            try:
+                dp = await fetch_prices_for_day(target)
+            except RateLimitError as exc:
+                raise rate_limited_error(exc) from exc
+            market, granularity, intervals = dp.market, dp.granularity, dp.intervals
+        return ORJSONResponse(
             {
-                "market": dp.market,
-                "granularity": dp.granularity,
+                "market": market,
+                "granularity": granularity,
                 "intervals": [
                     {
-                        "startTimeUtc": it.start_utc.isoformat(),
-                        "endTimeUtc": it.end_utc.isoformat(),
+                        # orjson serializes aware datetimes as ISO 8601 natively
+                        "startTimeUtc": it.start_utc,
+                        "endTimeUtc": it.end_utc,
                         "priceAmount": it.price_eur_per_mwh,
                         "priceCurrency": "EUR",
                         "unit": "MWh",
                     }
-                    for it in dp.intervals
+                    for it in intervals
                 ],
             },
         )
 
-    async def calculate_global_price_range(margin_cents: float) -> tuple[float, float]:
-        """Calculate global min/max price range for consistent chart scaling"""
+    @lru_cache(maxsize=64)
+    def compute_price_range(
+        cache_version: int,  # noqa: ARG001 - only keys the lru_cache
+        margin_cents: float,
+    ) -> tuple[float, float]:
+        """Rounded min/max for one cache version; a new version is a new key"""
 
         global_max = float("-inf")
         global_min = float("inf")
 
-        if not cache.intervals:
-            logger.warning(
-                "Cache empty during price range calculation, ensuring cache",
-            )
-            today = datetime.now(tz=HELSINKI_TZ).date()
-            await ensure_days_available([today, today + timedelta(days=1)])
-
-        intervals_processed = 0
-
-        for it in cache.intervals:
-            spot_cents_with_vat = eur_mwh_to_cents_kwh(it.price_eur_per_mwh)
-            total_price = spot_cents_with_vat + margin_cents
-
-            if intervals_processed < 5 or total_price > global_max:
-                logger.debug(
-                    "Interval %d: spot=%.2f, total=%.2f (margin=%.2f)",
-                    intervals_processed,
-                    spot_cents_with_vat,
-                    total_price,
-                    margin_cents,
-                )
-
-            global_max = max(global_max, total_price)
-            global_min = min(global_min, spot_cents_with_vat)
-            intervals_processed += 1
+        # The EUR/MWh -> c/kWh conversion is monotonic and the margin is constant,
+        # so the range follows directly from the extreme raw prices
+        prices = [it.price_eur_per_mwh for it in cache.intervals]
+        intervals_processed = len(prices)
+        if prices:
+            global_max = eur_mwh_to_cents_kwh(max(prices)) + margin_cents
+            global_min = eur_mwh_to_cents_kwh(min(prices))
 
         logger.debug("Processed %d intervals for scaling", intervals_processed)
 
@@ -580,20 +825,98 @@ def create_app() -> FastAPI:
                 min_price_rounded = math.floor(global_min)
 
         logger.info(
-            f"Global price range: {global_min:.2f} -> {global_max:.2f}, rounded: {min_price_rounded} -> {max_price_rounded} (margin: {margin_cents:.3f})",
+            "Global price range: %.2f -> %.2f, rounded: %s -> %s (margin: %.3f)",
+            global_min,
+            global_max,
+            min_price_rounded,
+            max_price_rounded,
+            margin_cents,
         )
         logger.info(
-            f"Y-axis range calculation: min={global_min:.2f} -> {min_price_rounded}, max={global_max:.2f} -> {max_price_rounded}",
+            "Y-axis range calculation: min=%.2f -> %s, max=%.2f -> %s",
+            global_min,
+            min_price_rounded,
+            global_max,
+            max_price_rounded,
         )
         logger.debug("Scaling calculation details: intervals=%d", intervals_processed)
 
         return min_price_rounded, max_price_rounded
 
-    @app.get("/api/chart-data", response_class=JSONResponse)
+    async def calculate_global_price_range(margin_cents: float) -> tuple[float, float]:
+        """Calculate global min/max price range for consistent chart scaling"""
+
+        if not cache.by_day:
+            logger.warning(
+                "Cache empty during price range calculation, ensuring cache",
+            )
+            today = datetime.now(tz=HELSINKI_TZ).date()
+            await ensure_days_available([today, today + timedelta(days=1)])
+
+        return compute_price_range(cache.version, margin_cents)
+
+    def dense_chart_rows(
+        intervals: t.Sequence[PriceInterval],
+        target: date,
+        margin_cents: float,
+    ) -> tuple[list[list[t.Any]], int]:
+        """Chart rows for every quarter of the target day, and how many have prices"""
+        LOW_PRICE = 5.0  # cents/kWh
+        HIGH_PRICE = 15.0  # cents/kWh
+
+        # Ensure all intervals are represented for consistent chart layout;
+        # when price data is not available, don't draw margin either
+        rows: list[list[t.Any]] = [
+            [str(i), 0, 0, 0, 0] for i in range(QUARTER_DAY_INTERVALS)
+        ]
+        priced = 0
+
+        # Place each interval of the target date at its local quarter-hour index
+        for it in intervals:
+            if it.start_local_date != target:
+                continue
+
+            spot_cents_with_vat = it.price_eur_per_mwh * CENTS_PER_KWH_PER_EUR_MWH
+            low_electricity = (
+                spot_cents_with_vat if spot_cents_with_vat < LOW_PRICE else 0
+            )
+            medium_electricity = (
+                spot_cents_with_vat
+                if LOW_PRICE <= spot_cents_with_vat < HIGH_PRICE
+                else 0
+            )
+            high_electricity = (
+                spot_cents_with_vat if spot_cents_with_vat >= HIGH_PRICE else 0
+            )
+
+            start_helsinki = it.start_local
+            index = start_helsinki.hour * 4 + start_helsinki.minute // 15
+            rows[index] = [
+                str(index),
+                low_electricity,
+                medium_electricity,
+                high_electricity,
+                margin_cents,
+            ]
+            priced += 1
+
+        return rows, priced
+
+    @lru_cache(maxsize=64)
+    def cached_chart_rows(
+        cache_version: int,  # noqa: ARG001 - only keys the lru_cache
+        target: date,
+        margin_cents: float,
+    ) -> tuple[list[list[t.Any]], int]:
+        """Chart rows for a cached day; a new cache version is a new key"""
+        return dense_chart_rows(cache.intervals_for_date(target), target, margin_cents)
+
+    @app.get("/api/chart-data", response_class=ORJSONResponse)
     async def api_chart_data(
+        request: Request,
         date_str: str,
         margin: float | None = Query(default=None),
-    ) -> JSONResponse:
+    ) -> Response:
         """API endpoint that provides data in Google Charts format like the Angular component"""
         try:
             margin_cents = (
@@ -612,121 +935,86 @@ def create_app() -> FastAPI:
                 margin_cents,
             )
 
-            # Calculate global price range for consistent scaling
-            global_min_price, global_max_price = await calculate_global_price_range(
-                margin_cents,
-            )
-
             intervals, metadata = await ensure_day_available(
                 target,
                 persist=persist,
             )
 
-            LOW_PRICE = 5.0  # cents/kWh
-            HIGH_PRICE = 15.0  # cents/kWh
-
-            chart_data = []
-
-            # Process all intervals and filter by target date in Helsinki timezone
-            if intervals:
-                for it in intervals:
-                    start_helsinki = it.start_utc.astimezone(HELSINKI_TZ)
-                    if start_helsinki.date() != target:
-                        continue
-
-                    spot_cents_with_vat = eur_mwh_to_cents_kwh(it.price_eur_per_mwh)
-                    low_electricity = (
-                        spot_cents_with_vat if spot_cents_with_vat < LOW_PRICE else 0
-                    )
-                    medium_electricity = (
-                        spot_cents_with_vat
-                        if LOW_PRICE <= spot_cents_with_vat < HIGH_PRICE
-                        else 0
-                    )
-                    high_electricity = (
-                        spot_cents_with_vat if spot_cents_with_vat >= HIGH_PRICE else 0
-                    )
-
-                    quarter = start_helsinki.minute // 15
-                    time_label = str(start_helsinki.hour * 4 + quarter)
-
-                    chart_data.append(
-                        [
-                            time_label,
-                            low_electricity,
-                            medium_electricity,
-                            high_electricity,
-                            margin_cents,
-                        ],
-                    )
-
-            # Sort chart data by time to ensure proper order
-            # Both hourly and 15-minute data now use integer indices, so sort numerically
-            chart_data.sort(key=lambda x: int(x[0]))
+            # Calculate global price range for consistent scaling; after the
+            # fetch above, so the range matches the cache version in the ETag
+            global_min_price, global_max_price = await calculate_global_price_range(
+                margin_cents,
+            )
 
-            # Ensure all intervals are represented for consistent chart layout
-            complete_chart_data = []
+            # Cached days only change with the cache version, so clients can
+            # revalidate them cheaply
+            headers: dict[str, str] = {}
+            if persist:
+                etag = make_etag(
+                    app_version,
+                    cache.version,
+                    target,
+                    f"{margin_cents:.3f}",
+                )
+                headers = {"ETag": etag, "Cache-Control": REVALIDATE_CACHE_CONTROL}
+                if etag_matches(request, etag):
+                    return Response(status_code=304, headers=headers)
+                complete_chart_data, actual_interval_count = cached_chart_rows(
+                    cache.version,
+                    target,
+                    margin_cents,
+                )
+            else:
+                complete_chart_data, actual_interval_count = dense_chart_rows(
+                    intervals,
+                    target,
+                    margin_cents,
+                )
             actual_granularity = DEFAULT_GRANULARITY
-            actual_interval_count = len(chart_data)
-
-            chart_data_dict = {row[0]: row for row in chart_data}
-            for i in range(QUARTER_DAY_INTERVALS):
-                time_key = str(i)
-                if time_key in chart_data_dict:
-                    complete_chart_data.append(chart_data_dict[time_key])
-                else:
-                    # When price data is not available, don't draw margin either
-                    complete_chart_data.append([time_key, 0, 0, 0, 0])
 
             # Handle case where no actual price data found
-            if not chart_data:
+            if not actual_interval_count:
                 logger.warning("No price data found for date %s", target)
-                return JSONResponse(
+                return ORJSONResponse(
                     {
                         "data": complete_chart_data,
                         "maxPrice": global_max_price,
                         "minPrice": global_min_price,
-                        "dateString": target.strftime("%A %m/%d/%Y"),
                         "dateIso": target.isoformat(),  # ISO format for client-side localization
                         "granularity": actual_granularity,
                         "intervalCount": actual_interval_count,
                         "expectedIntervalCount": len(complete_chart_data),
                         "error": "No price data available for this date",
                     },
+                    headers=headers,
                 )
 
-            return JSONResponse(
+            return ORJSONResponse(
                 {
                     "data": complete_chart_data,
                     "maxPrice": global_max_price,
                     "minPrice": global_min_price,
-                    "dateString": target.strftime("%A %m/%d/%Y"),
                     "dateIso": target.isoformat(),  # ISO format for client-side localization
                     "granularity": actual_granularity,
                     "intervalCount": actual_interval_count,
                     "expectedIntervalCount": len(complete_chart_data),
                 },
+                headers=headers,
             )
+        except HTTPException:
+            raise
         except Exception as e:
-            logger.error(f"Error in chart-data endpoint: {e}")
+            logger.error("Error in chart-data endpoint: %s", e)
             raise HTTPException(
                 status_code=500,
                 detail=f"Error fetching chart data: {e!s}",
             )
 
     def eur_mwh_to_cents_kwh(eur_per_mwh: float) -> float:
-        # 1 MWh = 1000 kWh; EUR/MWh to EUR/kWh then to cents; include VAT
-        eur_per_kwh = eur_per_mwh / 1000.0
-        cents_per_kwh = eur_per_kwh * 100.0
-        with_vat = cents_per_kwh * (1.0 + VAT_RATE)
-        return with_vat
+        return eur_per_mwh * CENTS_PER_KWH_PER_EUR_MWH
 
     def color_for_spot_cents(spot_cents: float) -> str:
-        if spot_cents < 5.0:
-            return "green"
-        if spot_cents < 15.0:
-            return "yellow"
-        return "red"
+        return SPOT_COLORS[bisect_right(SPOT_COLOR_THRESHOLDS, spot_cents)]
 
     def validate_margin(margin: float) -> float:
         """Validate margin parameter and ensure it's within acceptable range"""
@@ -743,31 +1031,38 @@ def create_app() -> FastAPI:
         return margin
 
     def build_view_model(
-        intervals: list[PriceInterval],
+        intervals: t.Sequence[PriceInterval],
         margin_cents: float,
         granularity: t.Literal["quarter_hour"],
     ) -> dict[str, t.Any]:
-        entries: list[dict[str, t.Any]] = []
-        for it in intervals:
-            spot_cents = eur_mwh_to_cents_kwh(it.price_eur_per_mwh)
-            total_cents = max(0.0, spot_cents) + max(0.0, margin_cents)
-            entries.append(
-                {
-                    "startUtc": it.start_utc,
-                    "endUtc": it.end_utc,
-                    "spotCents": spot_cents,
-                    "marginCents": margin_cents,
-                    "totalCents": total_cents,
-                    "color": color_for_spot_cents(spot_cents),
-                },
-            )
-        max_total = max((e["totalCents"] for e in entries), default=1.0) or 1.0
+        factor = CENTS_PER_KWH_PER_EUR_MWH
+        color_for = color_for_spot_cents
+        margin_total = max(0.0, margin_cents)
+        spot_values = [it.price_eur_per_mwh * factor for it in intervals]
+        entries: list[dict[str, t.Any]] = [
+            {
+                "startUtc": it.start_utc,
+                "endUtc": it.end_utc,
+                "spotCents": spot_cents,
+                "marginCents": margin_cents,
+                "totalCents": max(0.0, spot_cents) + margin_total,
+                "color": color_for(spot_cents),
+            }
+            for it, spot_cents in zip(intervals, spot_values, strict=True)
+        ]
+        # Totals grow with the spot price, so the largest one comes from the max
+        max_total = (
+            max(0.0, *spot_values) + margin_total if spot_values else 1.0
+        ) or 1.0
         return {
             "entries": entries,
             "maxTotal": max_total,
             "granularity": granularity,
         }
 
+    # Rendered /partials/prices HTML keyed by (cache version, date, margin, role)
+    rendered_partials: dict[tuple[int, date, str, str], str] = {}
+
     @app.get("/partials/prices", response_class=HTMLResponse)
     async def partial_prices(
         request: Request,
@@ -785,14 +1080,28 @@ def create_app() -> FastAPI:
             role,
             margin_cents,
         )
-        now_hel = datetime.now(tz=HELSINKI_TZ)
+        now_utc = datetime.now(UTC)
+        now_hel = now_utc.astimezone(HELSINKI_TZ)
         target, persist = resolve_target_date(date, now_hel)
         intervals, metadata = await ensure_day_available(
             target,
             persist=persist,
         )
-        filtered_intervals = [
-            it for it in intervals if _local_date(it.start_utc) == target
+        # Cached days only change with the cache version; the template echoes
+        # the effective margin, so equivalent margin strings share one render
+        chart_margin = str(margin_cents)
+        render_key = (cache.version, target, chart_margin, role)
+        headers: dict[str, str] = {}
+        if persist:
+            etag = make_etag(app_version, *render_key)
+            headers = {"ETag": etag, "Cache-Control": REVALIDATE_CACHE_CONTROL}
+            if etag_matches(request, etag):
+                return Response(status_code=304, headers=headers)
+            if render_key in rendered_partials:
+                return HTMLResponse(rendered_partials[render_key], headers=headers)
+
+        filtered_intervals: t.Sequence[PriceInterval] = [
+            it for it in intervals if it.start_local_date == target
         ]
 
         if not filtered_intervals:
@@ -801,100 +1110,174 @@ def create_app() -> FastAPI:
                 granularity=DEFAULT_GRANULARITY,
                 expected_intervals=QUARTER_DAY_INTERVALS,
                 published_at_utc=None,
-                last_fetched_utc=datetime.now(UTC),
+                last_fetched_utc=now_utc,
             )
 
         granularity = metadata.granularity if metadata else DEFAULT_GRANULARITY
         vm = build_view_model(filtered_intervals, margin_cents, granularity)
-        return templates.TemplateResponse(
-            "partials/prices.html",
+        html = prices_template.render(
             {
                 "request": request,
                 "vm": vm,
                 "chart_role": role,
                 "chart_date_iso": target.isoformat(),
+                "chart_margin": chart_margin,
             },
         )
+        if persist:
+            if len(rendered_partials) >= RENDERED_PARTIALS_MAX:
+                rendered_partials.clear()
+            rendered_partials[render_key] = html
+        return HTMLResponse(html, headers=headers)
+
+    def restore_cache_snapshot(path: Path) -> None:
+        try:
+            cache.load(path)
+        except FileNotFoundError:
+            logger.info("No cache snapshot at %s", path)
+            return
+        except (OSError, ValueError, KeyError, TypeError):
+            logger.exception("Ignoring unreadable cache snapshot %s", path)
+            return
+        logger.info("Restored %d cached days from %s", len(cache.by_day), path)
 
     async def startup_tasks():
-        """Warm cache on startup and launch background refresh loops."""
-
-        async def warmup_cache() -> None:
-            backoff = 10
-            while True:
-                try:
-                    now = datetime.now(tz=HELSINKI_TZ)
-                    targets = [now.date(), now.date() + timedelta(days=1)]
+        """Warm cache on startup and launch the background refresh scheduler."""
+        if cache_path:
+            restore_cache_snapshot(cache_path)
+        warmup_backoff = 10
+        poll_misses = 0
+
+        async def warmup_cache() -> float | None:
+            """Fetch today and tomorrow; returns the retry delay, None when done."""
+            nonlocal warmup_backoff
+            try:
+                today_d = datetime.now(tz=HELSINKI_TZ).date()
+                tomorrow_d = today_d + timedelta(days=1)
+                targets = [
+                    d for d in (today_d, tomorrow_d) if not cache.has_complete_day(d)
+                ]
+                if not targets:
+                    logger.info("Cache already warm, skipping warm-up")
+                    return None
+                await ensure_days_available(targets)
+                if all(cache.has_complete_day(d) for d in targets):
+                    logger.info("Initial cache warm-up succeeded")
+                    return None
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Startup warm-up failed; retrying")
+            # Full jitter keeps instances from retrying ENTSO-E in lockstep
+            delay = random.uniform(0, warmup_backoff)  # noqa: S311 - jitter, not crypto
+            if rate_limited_recently():
+                delay *= 2
+            warmup_backoff = min(warmup_backoff * 2, 300)
+            return max(delay, rate_limit_backoff())
+
+        async def fifteen_minute_health_check() -> float:
+            try:
+                now = datetime.now(tz=HELSINKI_TZ)
+                cache.prune(now)
+                today_d = now.date()
+                tomorrow_d = today_d + timedelta(days=1)
+                missing_today = not cache.has_complete_day(today_d)
+                missing_tomorrow = not cache.has_complete_day(tomorrow_d)
+                targets: list[date] = []
+                if missing_today:
+                    targets.append(today_d)
+                if missing_tomorrow:
+                    targets.append(tomorrow_d)
+                if targets:
                     await ensure_days_available(targets)
-                    if cache.has_complete_day(now.date()) and cache.has_complete_day(
-                        now.date() + timedelta(days=1),
-                    ):
-                        logger.info("Initial cache warm-up succeeded")
-                        return
-                except asyncio.CancelledError:
-                    raise
-                except Exception:
-                    logger.exception("Startup warm-up failed; retrying")
-                await asyncio.sleep(backoff)
-                backoff = min(backoff * 2, 300)
-
-        async def fifteen_minute_health_check_loop():
-            while True:
-                try:
-                    now = datetime.now(tz=HELSINKI_TZ)
-                    cache.prune()
-                    today_d = now.date()
-                    tomorrow_d = today_d + timedelta(days=1)
-                    missing_today = not cache.has_complete_day(today_d)
-                    missing_tomorrow = not cache.has_complete_day(tomorrow_d)
-                    targets: list[date] = []
-                    if missing_today:
-                        targets.append(today_d)
-                    if missing_tomorrow:
-                        targets.append(tomorrow_d)
-                    if targets:
-                        await ensure_days_available(targets)
-                except asyncio.CancelledError:
-                    raise
-                except Exception:
-                    logger.exception("Health check loop encountered an error")
-                await asyncio.sleep(15 * 60)
-
-        async def afternoon_polling_loop():
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Health check encountered an error")
+            # Wake on the next quarter-hour boundary
+            return HEALTH_CHECK_SECONDS - time.time() % HEALTH_CHECK_SECONDS
+
+        async def afternoon_poll() -> float:
             """Aggressively poll ENTSO-E between 14:00-14:30 Helsinki time."""
-            while True:
-                try:
-                    now = datetime.now(tz=HELSINKI_TZ)
-                    tomorrow_d = now.date() + timedelta(days=1)
-                    in_window = now.hour == 14 and now.minute <= 30
-                    if in_window and not cache.has_complete_day(tomorrow_d):
-                        fetched = await fetch_and_store_day(
-                            tomorrow_d,
-                            label=tomorrow_d.isoformat(),
-                        )
-                        await asyncio.sleep(60 if not fetched else 120)
-                        continue
-                except asyncio.CancelledError:
-                    raise
-                except Exception:
-                    logger.exception("Afternoon polling loop failed")
-                await asyncio.sleep(60)
-
-        _track_background_task(warmup_cache(), "warmup_cache")
-        _track_background_task(fifteen_minute_health_check_loop(), "health_check_loop")
-        _track_background_task(afternoon_polling_loop(), "afternoon_polling_loop")
-
-    @app.on_event("startup")
-    async def _on_startup() -> None:
-        await startup_tasks()
-
-    @app.on_event("shutdown")
-    async def _on_shutdown() -> None:
+            nonlocal poll_misses
+            try:
+                now = datetime.now(tz=HELSINKI_TZ)
+                tomorrow_d = now.date() + timedelta(days=1)
+                in_window = now.hour == 14 and now.minute <= 30
+                if in_window and not cache.has_complete_day(tomorrow_d):
+                    fetched = await fetch_and_store_day(
+                        tomorrow_d,
+                        label=tomorrow_d.isoformat(),
+                    )
+                    if not fetched:
+                        # Once a minute at most (RULES.md), slower after repeat misses
+                        delay = min(60 * (1 + poll_misses // 5), 180)
+                        if rate_limited_recently():
+                            delay *= 2
+                        poll_misses += 1
+                        jitter = random.uniform(0, 5)  # noqa: S311 - not crypto
+                        return max(delay + jitter, rate_limit_backoff())
+                    if not cache.has_complete_day(tomorrow_d):
+                        return 120
+                # Nothing (left) to poll for: sleep until the next window opens
+                poll_misses = 0
+                return seconds_until(next_polling_window(now))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Afternoon polling failed")
+            return 60
+
+        async def refresh_scheduler() -> None:
+            """Run every refresh job from one task, waking only when one is due.
+
+            Each job returns the delay until its next run, or None once it is
+            finished for good. The sequence number keeps ties in start order.
+            """
+            jobs: dict[str, t.Callable[[], t.Awaitable[float | None]]] = {
+                "warmup_cache": warmup_cache,
+                "health_check": fifteen_minute_health_check,
+                "afternoon_poll": afternoon_poll,
+            }
+            # Deadlines live on the loop's monotonic clock so wall-clock jumps
+            # cannot stall or burst the jobs; only the jobs read wall time
+            loop = asyncio.get_running_loop()
+            sequence = count()
+            start = loop.time()
+            heap = [(start, next(sequence), name) for name in jobs]
+            while heap:
+                due, _, name = heap[0]
+                await asyncio.sleep(max(0.0, due - loop.time()))
+                heapq.heappop(heap)
+                delay = await jobs[name]()
+                if delay is not None:
+                    heapq.heappush(heap, (loop.time() + delay, next(sequence), name))
+
+        _track_background_task(refresh_scheduler(), "refresh_scheduler")
+
+    async def shutdown_tasks() -> None:
         logger.info("Shutting down background tasks")
         for task in background_tasks:
             task.cancel()
         if background_tasks:
-            await asyncio.gather(*background_tasks, return_exceptions=True)
+            # Bounded wait: a task stuck in cleanup must not hang the shutdown
+            _, pending = await asyncio.wait(background_tasks, timeout=5.0)
+            if pending:
+                logger.warning(
+                    "%d background tasks did not stop in time",
+                    len(pending),
+                )
         background_tasks.clear()
+        if store_tasks:
+            # Short grace period so fetches under way still land in the cache
+            await asyncio.wait(store_tasks, timeout=3.0)
+        for task in inflight_fetches.values():
+            task.cancel()
+        if cache_path:
+            try:
+                cache.dump(cache_path)
+            except OSError:
+                logger.exception("Failed to write cache snapshot %s", cache_path)
+        await close_client()
 
     return app
@@ -17,7 +17,9 @@ def test_sse_endpoint(base_url="http://localhost:8000"):
     print("Press Ctrl+C to stop\n")
     
     try:
-        with requests.get(url, stream=True, timeout=60) as response:
+        with requests.Session() as session, session.get(
+            url, stream=True, timeout=60,
+        ) as response:
             print(f"Status Code: {response.status_code}")
             print(f"Headers:")
             for header, value in response.headers.items():
@@ -55,8 +57,11 @@ def test_sse_endpoint(base_url="http://localhost:8000"):
             print("-" * 60)
             
             event_count = 0
-            for line in response.iter_lines(decode_unicode=True):
-                if line:
+            # SSE frames are ASCII; decode bytes directly instead of going
+            # through requests' incremental decoder for every line
+            for raw in response.iter_lines(decode_unicode=False):
+                if raw:
+                    line = raw.decode("ascii", "replace")
                     print(f"[{time.strftime('%H:%M:%S')}] {line}")
                     if line.startswith("event:") or line.startswith("data:"):
                         event_count += 1
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+from datetime import UTC, date, datetime, timedelta
+
+from spot.main import Cache, DayPrices, PriceInterval, make_etag
+
+
+def test_cache_snapshot_round_trip(tmp_path):
+    """Test that a dumped cache loads back with the same days and metadata."""
+    target = date(2025, 10, 15)
+    start = datetime(2025, 10, 14, 21, 0, tzinfo=UTC)
+    intervals = [
+        PriceInterval(
+            start + timedelta(minutes=15 * i),
+            start + timedelta(minutes=15 * (i + 1)),
+            float(i),
+        )
+        for i in range(96)
+    ]
+    published = datetime(2025, 10, 14, 11, 0, tzinfo=UTC)
+    now_utc = datetime(2025, 10, 14, 12, 0, tzinfo=UTC)
+
+    original = Cache()
+    original.upsert_day(
+        target,
+        DayPrices(
+            market="FI",
+            granularity="quarter_hour",
+            intervals=intervals,
+            published_at_utc=published,
+        ),
+        now_utc=now_utc,
+    )
+    path = tmp_path / "cache.json"
+    original.dump(path)
+
+    restored = Cache()
+    restored.load(path, now_utc=now_utc)
+
+    assert restored.intervals_for_date(target) == intervals
+    assert restored.intervals_for_date(target)[0].start_local_date == target
+    assert restored.day_metadata[target] == original.day_metadata[target]
+    assert restored.has_complete_day(target)
+    assert restored.version > 0
+
+
+def test_cache_snapshot_restore_does_not_reuse_etags(tmp_path):
+    """Test that a restored cache gets a version, and so ETags, of its own."""
+    target = date(2025, 10, 15)
+    start = datetime(2025, 10, 14, 21, 0, tzinfo=UTC)
+    now_utc = datetime(2025, 10, 14, 12, 0, tzinfo=UTC)
+    original = Cache()
+    original.upsert_day(
+        target,
+        DayPrices(
+            market="FI",
+            granularity="quarter_hour",
+            intervals=[
+                PriceInterval(
+                    start + timedelta(minutes=15 * i),
+                    start + timedelta(minutes=15 * (i + 1)),
+                    1.0,
+                )
+                for i in range(96)
+            ],
+            published_at_utc=None,
+        ),
+        now_utc=now_utc,
+    )
+    path = tmp_path / "cache.json"
+    original.dump(path)
+
+    # A restarted process starts from a fresh cache and loads the snapshot
+    restored = Cache()
+    restored.load(path, now_utc=now_utc)
+
+    assert restored.version > original.version
+    assert make_etag("dev", restored.version, target) != make_etag(
+        "dev",
+        original.version,
+        target,
+    )
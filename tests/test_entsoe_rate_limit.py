@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import date
+
+import httpx
+import pytest
+
+from spot import entsoe
+from spot.entsoe import (
+    RateLimitError,
+    fetch_day_ahead_prices,
+    rate_limit_backoff,
+    rate_limited_recently,
+)
+
+PUBLICATION_XML = b"""<?xml version="1.0" encoding="UTF-8"?>
+<Publication_MarketDocument xmlns="urn:iec62325.351:tc57wg16:451-3:publicationdocument:7:3">
+  <TimeSeries>
+    <Period>
+      <timeInterval>
+        <start>2025-08-12T21:00Z</start>
+        <end>2025-08-13T21:00Z</end>
+      </timeInterval>
+      <resolution>PT60M</resolution>
+      <Point>
+        <position>1</position>
+        <price.amount>50.0</price.amount>
+      </Point>
+    </Period>
+  </TimeSeries>
+</Publication_MarketDocument>
+"""
+
+
+@pytest.mark.asyncio
+async def test_fetch_succeeds_after_retry_after(monkeypatch):
+    """Test that a 429 fails fast until Retry-After, then the fetch goes through."""
+    responses = [
+        httpx.Response(429, headers={"Retry-After": "0.2"}),
+        httpx.Response(200, content=PUBLICATION_XML),
+    ]
+    requests: list[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return responses[len(requests) - 1]
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(entsoe, "_client", client)
+    monkeypatch.setattr(entsoe, "_rate_limited_until", 0.0)
+    monkeypatch.setattr(entsoe, "_last_rate_limited", float("-inf"))
+    target = date(2025, 8, 13)
+
+    with pytest.raises(RateLimitError):
+        await fetch_day_ahead_prices("token", target)
+    assert 0 < rate_limit_backoff() <= 0.2
+    assert rate_limited_recently()
+
+    # Inside the Retry-After pause ENTSO-E is not asked again
+    with pytest.raises(RateLimitError):
+        await fetch_day_ahead_prices("token", target)
+    assert len(requests) == 1
+
+    await asyncio.sleep(0.25)
+    series = await fetch_day_ahead_prices("token", target)
+    assert len(requests) == 2
+    assert series.points[0].price_eur_per_mwh == 50.0
+    assert rate_limited_recently()
+    await client.aclose()
@@ -2,9 +2,13 @@ from __future__ import annotations
 
 from datetime import UTC, timedelta
 
+import pytest
+
 from spot.entsoe import (
+    DataNotAvailable,
     DaySeries,
     PricePoint,
+    _iso_to_dt,
     _simulate_15min_from_hourly,
     parse_publication_xml,
 )
@@ -41,6 +45,95 @@ def test_parse_with_gaps_fills_prices():
     assert series.points[2].price_eur_per_mwh == 55.0
 
 
+EDGE_GAPS_XML = b"""<?xml version="1.0" encoding="UTF-8"?>
+<Publication_MarketDocument xmlns="urn:iec62325.351:tc57wg16:451-3:publicationdocument:7:3">
+  <TimeSeries>
+    <Period>
+      <timeInterval>
+        <start>2025-08-13T00:00Z</start>
+        <end>2025-08-13T04:00Z</end>
+      </timeInterval>
+      <resolution>PT60M</resolution>
+      <Point>
+        <position>2</position>
+        <price.amount>-1.5</price.amount>
+      </Point>
+      <Point>
+        <position>3</position>
+        <price.amount>0</price.amount>
+      </Point>
+    </Period>
+  </TimeSeries>
+</Publication_MarketDocument>
+"""
+
+
+def test_parse_fills_leading_and_trailing_gaps():
+    series = parse_publication_xml(EDGE_GAPS_XML)
+    prices = [p.price_eur_per_mwh for p in series.points]
+    assert prices == [-1.5, -1.5, 0.0, 0.0]
+    assert series.points[-1].end_utc == series.points[0].start_utc + timedelta(
+        hours=4,
+    )
+
+
+DUPLICATE_POSITION_XML = b"""<?xml version="1.0" encoding="UTF-8"?>
+<Publication_MarketDocument xmlns="urn:iec62325.351:tc57wg16:451-3:publicationdocument:7:3">
+  <TimeSeries>
+    <Period>
+      <timeInterval>
+        <start>2025-08-13T00:00Z</start>
+        <end>2025-08-13T03:00Z</end>
+      </timeInterval>
+      <resolution>PT60M</resolution>
+      <Point>
+        <position>1</position>
+        <price.amount>10.0</price.amount>
+      </Point>
+      <Point>
+        <position>2</position>
+        <price.amount>5.0</price.amount>
+      </Point>
+      <Point>
+        <position>2</position>
+        <price.amount>20.0</price.amount>
+      </Point>
+    </Period>
+  </TimeSeries>
+</Publication_MarketDocument>
+"""
+
+
+def test_parse_duplicate_position_keeps_last_price():
+    series = parse_publication_xml(DUPLICATE_POSITION_XML)
+    prices = [p.price_eur_per_mwh for p in series.points]
+    assert prices == [10.0, 20.0, 20.0]
+
+
+def test_iso_to_dt_handles_canonical_and_offset_forms():
+    from datetime import datetime
+
+    expected = datetime(2025, 8, 12, 21, 0, tzinfo=UTC)
+    assert _iso_to_dt("2025-08-12T21:00Z") == expected
+    assert _iso_to_dt("2025-08-12T21:00:00Z") == expected
+    assert _iso_to_dt("2025-08-13T00:00+03:00") == expected
+
+
+ACKNOWLEDGEMENT_XML = b"""<?xml version="1.0" encoding="UTF-8"?>
+<Acknowledgement_MarketDocument xmlns="urn:iec62325.351:tc57wg16:451-1:acknowledgementdocument:7:0">
+  <Reason>
+    <code>999</code>
+    <text>No matching data found for Data item Day-ahead Prices</text>
+  </Reason>
+</Acknowledgement_MarketDocument>
+"""
+
+
+def test_parse_acknowledgement_raises_data_not_available():
+    with pytest.raises(DataNotAvailable, match="No matching data found"):
+        parse_publication_xml(ACKNOWLEDGEMENT_XML)
+
+
 EXAMPLE_15MIN_XML = b"""<?xml version="1.0" encoding="UTF-8"?>
 <Publication_MarketDocument xmlns="urn:iec62325.351:tc57wg16:451-3:publicationdocument:7:0">
   <TimeSeries>